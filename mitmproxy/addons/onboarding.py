@@ -27,7 +27,6 @@ class Onboarding(asgiapp.WSGIApp):
 
     def configure(self, updated):
         self.host = ctx.options.onboarding_host
-        app.config["CONFDIR"] = ctx.options.confdir
 
     async def request(self, f):
         if ctx.options.onboarding:
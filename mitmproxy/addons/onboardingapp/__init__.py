@@ -1,14 +1,19 @@
+import datetime
 import os
 
 from flask import Flask
+from flask import make_response
 from flask import render_template
+from flask import request
+from werkzeug.http import generate_etag
 
 from mitmproxy import ctx
-from mitmproxy.options import CONF_DIR
 from mitmproxy.utils.magisk import write_magisk_module
 
 app = Flask(__name__)
-app.config["CONFDIR"] = CONF_DIR
+
+# path -> (mtime_ns, contents, etag)
+_cert_cache: dict[str, tuple[int, bytes, str]] = {}
 
 
 @app.route("/")
@@ -40,23 +45,31 @@ def magisk():
     if not os.path.exists(p):
         write_magisk_module(p)
 
-    with open(p, "rb") as f:
-        cert = f.read()
-
-    return cert, {
-        "Content-Type": "application/zip",
-        "Content-Disposition": f"attachment; filename={filename}",
-    }
+    return _send(p, "application/zip", filename)
 
 
 def read_cert(ext, content_type):
     filename = ctx.options.ca_basename + f"-ca-cert.{ext}"
     p = os.path.join(ctx.options.confdir, filename)
     p = os.path.expanduser(p)
-    with open(p, "rb") as f:
-        cert = f.read()
-
-    return cert, {
-        "Content-Type": content_type,
-        "Content-Disposition": f"attachment; filename={filename}",
-    }
+    return _send(p, content_type, filename)
+
+
+def _send(p: str, content_type: str, filename: str):
+    # We don't use send_file here: WsgiToAsgi never closes the response iterable,
+    # which would leak the file handle on every download.
+    cached = _cert_cache.get(p)
+    if cached is None or cached[0] != os.stat(p).st_mtime_ns:
+        with open(p, "rb") as f:
+            # Take the mtime from the file we actually read, not from the stat call above.
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            data = f.read()
+        cached = _cert_cache[p] = (mtime_ns, data, generate_etag(data))
+    mtime_ns, data, etag = cached
+
+    response = make_response(data)
+    response.headers["Content-Type"] = content_type
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.last_modified = datetime.datetime.fromtimestamp(mtime_ns / 1e9, datetime.timezone.utc)
+    response.set_etag(etag)
+    return response.make_conditional(request)
@@ -1,12 +1,19 @@
 import contextlib
 import datetime
+import hashlib
 import ipaddress
 import logging
 import os
-import sys
+import re
+import struct
+import threading
+import time
 import warnings
+from collections import deque
+from collections import OrderedDict
 from collections.abc import Iterable
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import cast
 from typing import NewType
@@ -54,11 +61,29 @@ rD693XKIHUCWOjMh1if6omGXKHH40QuME2gNa50+YPn1iYDl88uDbbMCAQI=
 class Cert(serializable.Serializable):
     """Representation of a (TLS) certificate."""
 
+    __slots__ = (
+        "_cert",
+        "_fingerprint",
+        "_cn_cache",
+        "_altnames_cache",
+        "_subject_cache",
+        "_issuer_cache",
+    )
+
     _cert: x509.Certificate
 
     def __init__(self, cert: x509.Certificate):
         assert isinstance(cert, x509.Certificate)
         self._cert = cert
+        self._clear_caches()
+
+    def _clear_caches(self) -> None:
+        # x509.Certificate is immutable, so derived values can be cached until _cert is replaced.
+        self._fingerprint: bytes | None = None
+        self._cn_cache: tuple[str | None] | None = None
+        self._altnames_cache: x509.GeneralNames | None = None
+        self._subject_cache: tuple[tuple[str, str], ...] | None = None
+        self._issuer_cache: tuple[tuple[str, str], ...] | None = None
 
     def __eq__(self, other):
         return self.fingerprint() == other.fingerprint()
@@ -79,6 +104,7 @@ class Cert(serializable.Serializable):
 
     def set_state(self, state):
         self._cert = x509.load_pem_x509_certificate(state)
+        self._clear_caches()
 
     @classmethod
     def from_pem(cls, data: bytes) -> "Cert":
@@ -99,11 +125,15 @@ class Cert(serializable.Serializable):
         return self._cert.public_key()
 
     def fingerprint(self) -> bytes:
-        return self._cert.fingerprint(hashes.SHA256())
+        if self._fingerprint is None:
+            self._fingerprint = self._cert.fingerprint(hashes.SHA256())
+        return self._fingerprint
 
     @property
     def issuer(self) -> list[tuple[str, str]]:
-        return _name_to_keyval(self._cert.issuer)
+        if self._issuer_cache is None:
+            self._issuer_cache = tuple(_name_to_keyval(self._cert.issuer))
+        return list(self._issuer_cache)
 
     @property
     def notbefore(self) -> datetime.datetime:
@@ -122,13 +152,13 @@ class Cert(serializable.Serializable):
             return self._cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
 
     def has_expired(self) -> bool:
-        if sys.version_info < (3, 11):  # pragma: no cover
-            return datetime.datetime.now(datetime.timezone.utc) > self.notafter
-        return datetime.datetime.now(datetime.UTC) > self.notafter
+        return _utcnow_coarse() > self.notafter
 
     @property
     def subject(self) -> list[tuple[str, str]]:
-        return _name_to_keyval(self._cert.subject)
+        if self._subject_cache is None:
+            self._subject_cache = tuple(_name_to_keyval(self._cert.subject))
+        return list(self._subject_cache)
 
     @property
     def serial(self) -> int:
@@ -159,10 +189,10 @@ class Cert(serializable.Serializable):
 
     @property
     def cn(self) -> str | None:
-        attrs = self._cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
-        if attrs:
-            return cast(str, attrs[0].value)
-        return None
+        if self._cn_cache is None:
+            attrs = self._cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+            self._cn_cache = (cast(str, attrs[0].value) if attrs else None,)
+        return self._cn_cache[0]
 
     @property
     def organization(self) -> str | None:
@@ -176,21 +206,70 @@ class Cert(serializable.Serializable):
         """
         Get all SubjectAlternativeName DNS altnames.
         """
-        try:
-            sans = self._cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
-        except x509.ExtensionNotFound:
-            return x509.GeneralNames([])
-        else:
-            return x509.GeneralNames(sans)
+        if self._altnames_cache is None:
+            try:
+                sans = self._cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+            except x509.ExtensionNotFound:
+                self._altnames_cache = x509.GeneralNames([])
+            else:
+                self._altnames_cache = x509.GeneralNames(sans)
+        return self._altnames_cache
+
+
+_now_ts = float("-inf")
+_now_dt = datetime.datetime.now(datetime.timezone.utc)
+
+
+def _utcnow_coarse() -> datetime.datetime:
+    """
+    The current UTC time, refreshed at most once per second.
+    This is precise enough for certificate expiry checks.
+    """
+    global _now_ts, _now_dt
+    t = time.monotonic()
+    if t - _now_ts > 1.0:
+        _now_dt = datetime.datetime.now(datetime.timezone.utc)
+        _now_ts = t
+    return _now_dt
 
 
 def _name_to_keyval(name: x509.Name) -> list[tuple[str, str]]:
-    parts = []
-    for attr in name:
-        k = attr.rfc4514_string().partition("=")[0]
-        v = cast(str, attr.value)
-        parts.append((k, v))
-    return parts
+    # rfc4514_attribute_name gives the same key as rfc4514_string() without escaping the value.
+    return [(attr.rfc4514_attribute_name, cast(str, attr.value)) for attr in name]
+
+
+_serial_lock = threading.Lock()
+_serial_pool = b""
+_serial_pos = 0
+
+
+def _reset_serial_pool() -> None:
+    global _serial_lock, _serial_pool, _serial_pos
+    # Another thread may have held the lock while forking, in which case it stays locked in the child.
+    _serial_lock = threading.Lock()
+    _serial_pool = b""
+    _serial_pos = 0
+
+
+# A forked child must not hand out the same serial numbers as its parent.
+if hasattr(os, "register_at_fork"):  # not available on Windows
+    os.register_at_fork(after_in_child=_reset_serial_pool)
+
+
+def _next_serial() -> int:
+    """
+    Like x509.random_serial_number(), but draws from a pool of random bytes
+    that is refilled once every 512 serials.
+    """
+    global _serial_pool, _serial_pos
+    with _serial_lock:
+        if _serial_pos >= len(_serial_pool):
+            _serial_pool = os.urandom(20 * 512)
+            _serial_pos = 0
+        chunk = _serial_pool[_serial_pos : _serial_pos + 20]
+        _serial_pos += 20
+    # RFC 5280 §4.1.2.2: serial numbers must be positive and at most 20 octets.
+    return int.from_bytes(chunk, "big") >> 1
 
 
 def create_ca(
@@ -211,7 +290,7 @@ def create_ca(
         ]
     )
     builder = x509.CertificateBuilder()
-    builder = builder.serial_number(x509.random_serial_number())
+    builder = builder.serial_number(_next_serial())
     builder = builder.subject_name(name)
     builder = builder.not_valid_before(now - datetime.timedelta(days=2))
     builder = builder.not_valid_after(now + CA_EXPIRY)
@@ -241,6 +320,20 @@ def create_ca(
     return private_key, cert
 
 
+# Anything that may be an IPv4/IPv6 address (with optional zone id). Hostnames can match as well.
+_IP_LIKE = re.compile(r"[\d.:a-fA-F]+(%.+)?")
+
+
+@lru_cache(maxsize=2048)
+def _parse_san_str(x: str) -> x509.GeneralName:
+    if _IP_LIKE.fullmatch(x):
+        try:
+            return x509.IPAddress(ipaddress.ip_address(x))
+        except ValueError:
+            pass
+    return x509.DNSName(x.encode("idna").decode())
+
+
 def _fix_legacy_sans(sans: Iterable[x509.GeneralName] | list[str]) -> x509.GeneralNames:
     """
     SANs used to be a list of strings in mitmproxy 10.1 and below, but now they're a list of GeneralNames.
@@ -255,16 +348,7 @@ def _fix_legacy_sans(sans: Iterable[x509.GeneralName] | list[str]) -> x509.Gener
             stacklevel=2,
         )
 
-        ss: list[x509.GeneralName] = []
-        for x in cast(list[str], sans):
-            try:
-                ip = ipaddress.ip_address(x)
-            except ValueError:
-                x = x.encode("idna").decode()
-                ss.append(x509.DNSName(x))
-            else:
-                ss.append(x509.IPAddress(ip))
-        return x509.GeneralNames(ss)
+        return x509.GeneralNames([_parse_san_str(x) for x in cast(list[str], sans)])
     else:
         return x509.GeneralNames(sans)
 
@@ -287,10 +371,42 @@ def dummy_cert(
 
     Returns cert if operation succeeded, None if not.
     """
+    return _dummy_cert(privkey, _dummy_cert_template(cacert), commonname, _fix_legacy_sans(sans), organization)
+
+
+def _dummy_cert_template(cacert: x509.Certificate) -> x509.CertificateBuilder:
+    """
+    Returns a certificate builder with all fields that only depend on the CA certificate.
+    """
+    ca_public_key = cacert.public_key()
     builder = x509.CertificateBuilder()
     builder = builder.issuer_name(cacert.subject)
     builder = builder.add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
-    builder = builder.public_key(cacert.public_key())
+    builder = builder.public_key(ca_public_key)
+    # https://datatracker.ietf.org/doc/html/rfc5280#section-4.2.1.1
+    builder = builder.add_extension(
+        x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_public_key),  # type: ignore
+        critical=False,
+    )
+    # If CA and leaf cert have the same Subject Key Identifier, SChannel breaks in funny ways,
+    # see https://github.com/mitmproxy/mitmproxy/issues/6494.
+    # https://datatracker.ietf.org/doc/html/rfc5280#section-4.2.1.2 states
+    # that SKI is optional for the leaf cert, so we skip that.
+    return builder
+
+
+def _dummy_cert(
+    privkey: rsa.RSAPrivateKey,
+    template: x509.CertificateBuilder,
+    commonname: str | None,
+    sans: x509.GeneralNames,
+    organization: str | None = None,
+) -> Cert:
+    """
+    Like `dummy_cert`, but starts from a builder created by `_dummy_cert_template`,
+    which `CertStore` creates only once, and expects already normalized SANs.
+    """
+    builder = template
 
     now = datetime.datetime.now()
     builder = builder.not_valid_before(now - datetime.timedelta(days=2))
@@ -305,28 +421,24 @@ def dummy_cert(
         assert organization is not None
         subject.append(x509.NameAttribute(NameOID.ORGANIZATION_NAME, organization))
     builder = builder.subject_name(x509.Name(subject))
-    builder = builder.serial_number(x509.random_serial_number())
+    builder = builder.serial_number(_next_serial())
 
     # RFC 5280 §4.2.1.6: subjectAltName is critical if subject is empty.
     builder = builder.add_extension(
-        x509.SubjectAlternativeName(_fix_legacy_sans(sans)),
+        x509.SubjectAlternativeName(sans),
         critical=not is_valid_commonname,
     )
 
-    # https://datatracker.ietf.org/doc/html/rfc5280#section-4.2.1.1
-    builder = builder.add_extension(
-        x509.AuthorityKeyIdentifier.from_issuer_public_key(cacert.public_key()),
-        critical=False,
-    )
-    # If CA and leaf cert have the same Subject Key Identifier, SChannel breaks in funny ways,
-    # see https://github.com/mitmproxy/mitmproxy/issues/6494.
-    # https://datatracker.ietf.org/doc/html/rfc5280#section-4.2.1.2 states
-    # that SKI is optional for the leaf cert, so we skip that.
-
     cert = builder.sign(private_key=privkey, algorithm=hashes.SHA256())  # type: ignore
     return Cert(cert)
 
 
+@lru_cache(maxsize=4096)
+def _asterisk_forms(dn: str) -> tuple[str, ...]:
+    parts = dn.split(".")
+    return (dn, *("*." + ".".join(parts[i:]) for i in range(1, len(parts))))
+
+
 @dataclass(frozen=True)
 class CertStoreEntry:
     cert: Cert
@@ -338,10 +450,51 @@ class CertStoreEntry:
 TCustomCertId = str  # manually provided certs (e.g. mitmproxy's --certs)
 TGeneratedCertId = tuple[Optional[str], x509.GeneralNames]  # (common_name, sans)
 TCertId = Union[TCustomCertId, TGeneratedCertId]
+TLookupKey = tuple[Optional[str], tuple[tuple[str, str], ...]]  # (common_name, sorted (san type, san value) pairs)
 
 DHParams = NewType("DHParams", bytes)
 
 
+# chain file -> (sha256 of its contents, certificates)
+_chain_certs_cache: dict[Path, tuple[bytes, list[Cert]]] = {}
+
+
+def _load_chain_certs(path: Path) -> list[Cert]:
+    """
+    Load all certificates from a PEM file, reusing the previous result if the file contents have not changed.
+    """
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).digest()
+    cached = _chain_certs_cache.get(path)
+    if cached is None or cached[0] != digest:
+        certs = [Cert(c) for c in x509.load_pem_x509_certificates(raw)]
+        cached = _chain_certs_cache[path] = (digest, certs)
+    return list(cached[1])
+
+
+def _parse_dhparam(raw: bytes) -> DHParams:
+    # we could use cryptography for this, but it's unclear how to convert cryptography's object to pyOpenSSL's
+    # expected format.
+    bio = OpenSSL.SSL._lib.BIO_new_mem_buf(raw, len(raw))  # type: ignore
+    if bio != OpenSSL.SSL._ffi.NULL:  # type: ignore
+        bio = OpenSSL.SSL._ffi.gc(bio, OpenSSL.SSL._lib.BIO_free)  # type: ignore
+        dh = OpenSSL.SSL._lib.PEM_read_bio_DHparams(  # type: ignore
+            bio,
+            OpenSSL.SSL._ffi.NULL,  # type: ignore
+            OpenSSL.SSL._ffi.NULL,  # type: ignore
+            OpenSSL.SSL._ffi.NULL,  # type: ignore
+        )
+        dh = OpenSSL.SSL._ffi.gc(dh, OpenSSL.SSL._lib.DH_free)  # type: ignore
+        return dh
+    raise RuntimeError("Error loading DH Params.")  # pragma: no cover
+
+
+@lru_cache(maxsize=None)
+def _default_dhparam() -> DHParams:
+    # Parsed once and shared, SSL_CTX_set_tmp_dh copies the parameters.
+    return _parse_dhparam(DEFAULT_DHPARAM)
+
+
 class CertStore:
     """
     Implements an in-memory certificate store.
@@ -354,7 +507,11 @@ class CertStore:
     default_chain_certs: list[Cert]
     dhparams: DHParams
     certs: dict[TCertId, CertStoreEntry]
-    expire_queue: list[CertStoreEntry]
+    expire_queue: deque[CertStoreEntry]
+    _lookup_cache: OrderedDict[TLookupKey, CertStoreEntry]
+    _entry_keys: dict[int, list[TCertId]]
+    _entry_lookup_keys: dict[int, TLookupKey]
+    _known_suffixes: set[str]
 
     def __init__(
         self,
@@ -362,20 +519,39 @@ class CertStore:
         default_ca: Cert,
         default_chain_file: Path | None,
         dhparams: DHParams,
+        default_chain_certs: list[Cert] | None = None,
     ):
+        """
+        default_chain_certs: The certificates in default_chain_file, if the caller has already parsed them.
+        """
         self.default_privatekey = default_privatekey
         self.default_ca = default_ca
         self.default_chain_file = default_chain_file
-        self.default_chain_certs = [Cert(c) for c in x509.load_pem_x509_certificates(self.default_chain_file.read_bytes())] if self.default_chain_file else [default_ca]
+        self._dummy_cert_template = _dummy_cert_template(default_ca._cert)
+        if default_chain_certs is not None:
+            self.default_chain_certs = default_chain_certs
+        elif self.default_chain_file:
+            self.default_chain_certs = _load_chain_certs(self.default_chain_file)
+        else:
+            self.default_chain_certs = [default_ca]
         self.dhparams = dhparams
         self.certs = {}
-        self.expire_queue = []
+        self.expire_queue = deque()
+        self._lookup_cache = OrderedDict()
+        self._entry_keys = {}
+        self._entry_lookup_keys = {}
+        self._known_suffixes = set()
 
     def expire(self, entry: CertStoreEntry) -> None:
         self.expire_queue.append(entry)
         if len(self.expire_queue) > self.STORE_CAP:
-            d = self.expire_queue.pop(0)
-            self.certs = {k: v for k, v in self.certs.items() if v != d}
+            d = self.expire_queue.popleft()
+            for k in self._entry_keys.pop(id(d), []):
+                if self.certs.get(k) is d:
+                    del self.certs[k]
+            lookup_key = self._entry_lookup_keys.pop(id(d), None)
+            if lookup_key is not None and self._lookup_cache.get(lookup_key) is d:
+                del self._lookup_cache[lookup_key]
 
     @staticmethod
     def load_dhparam(path: Path) -> DHParams:
@@ -384,22 +560,10 @@ class CertStore:
         if not path.exists():
             path.write_bytes(DEFAULT_DHPARAM)
 
-        # we could use cryptography for this, but it's unclear how to convert cryptography's object to pyOpenSSL's
-        # expected format.
-        bio = OpenSSL.SSL._lib.BIO_new_file(  # type: ignore
-            str(path).encode(sys.getfilesystemencoding()), b"r"
-        )
-        if bio != OpenSSL.SSL._ffi.NULL:  # type: ignore
-            bio = OpenSSL.SSL._ffi.gc(bio, OpenSSL.SSL._lib.BIO_free)  # type: ignore
-            dh = OpenSSL.SSL._lib.PEM_read_bio_DHparams(  # type: ignore
-                bio,
-                OpenSSL.SSL._ffi.NULL,  # type: ignore
-                OpenSSL.SSL._ffi.NULL,  # type: ignore
-                OpenSSL.SSL._ffi.NULL,  # type: ignore
-            )
-            dh = OpenSSL.SSL._ffi.gc(dh, OpenSSL.SSL._lib.DH_free)  # type: ignore
-            return dh
-        raise RuntimeError("Error loading DH Params.")  # pragma: no cover
+        raw = path.read_bytes()
+        if raw == DEFAULT_DHPARAM:
+            return _default_dhparam()
+        return _parse_dhparam(raw)
 
     @classmethod
     def from_store(
@@ -420,16 +584,31 @@ class CertStore:
 
     @classmethod
     def from_files(cls, ca_file: Path, dhparam_file: Path, passphrase: bytes | None = None) -> "CertStore":
+        # Parsing (and validating) the RSA key is slow, so we keep a DER copy of the
+        # unencrypted key and certificates next to the PEM file, keyed on a digest of its contents.
+        # Encrypted keys are never written to the cache.
         raw = ca_file.read_bytes()
-        key = load_pem_private_key(raw, passphrase)
+        digest = hashlib.sha256(raw).digest()
+        cache_file = ca_file.with_suffix(ca_file.suffix + ".cache")
+        cached = _read_ca_cache(cache_file, digest) if passphrase is None else None
+        if cached:
+            key, certs = cached
+        else:
+            key_block, cert_blocks = _split_pem(raw)
+            key = load_pem_private_key(key_block, passphrase)
+            if not cert_blocks:
+                raise ValueError(f"No certificate found in {ca_file}.")
+            certs = [x509.load_pem_x509_certificate(b) for b in cert_blocks]
+            if passphrase is None:
+                _write_ca_cache(cache_file, digest, key, certs)
         dh = cls.load_dhparam(dhparam_file)
-        certs = x509.load_pem_x509_certificates(raw)
-        ca = Cert(certs[0])
+        chain_certs = [Cert(c) for c in certs]
+        ca = chain_certs[0]
         if len(certs) > 1:
             chain_file: Path | None = ca_file
         else:
             chain_file = None
-        return cls(key, ca, chain_file, dh)
+        return cls(key, ca, chain_file, dh, chain_certs)
 
     @staticmethod
     @contextlib.contextmanager
@@ -534,12 +713,18 @@ class CertStore:
         Adds a cert to the certstore. We register the CN in the cert plus
         any SANs, and also the list of names provided as an argument.
         """
+        keys: list[str] = []
         if entry.cert.cn:
-            self.certs[entry.cert.cn] = entry
+            keys.append(entry.cert.cn)
         for i in entry.cert.altnames:
-            self.certs[str(i.value)] = entry
-        for i in names:
-            self.certs[i] = entry
+            keys.append(str(i.value))
+        keys.extend(names)
+        for k in keys:
+            self.certs[k] = entry
+            self._known_suffixes.add(k.rpartition(".")[2])
+        self._entry_keys.setdefault(id(entry), []).extend(keys)
+        # The new entry may shadow previously resolved lookups.
+        self._lookup_cache.clear()
 
     @staticmethod
     def asterisk_forms(dn: str | x509.GeneralName) -> list[str]:
@@ -548,16 +733,37 @@ class CertStore:
         [b"www.example.com", b"*.example.com", b"*.com"]. The single wildcard "*" is omitted.
         """
         if isinstance(dn, str):
-            parts = dn.split(".")
-            ret = [dn]
-            for i in range(1, len(parts)):
-                ret.append("*." + ".".join(parts[i:]))
-            return ret
+            return list(_asterisk_forms(dn))
         elif isinstance(dn, x509.DNSName):
-            return CertStore.asterisk_forms(dn.value)
+            return list(_asterisk_forms(dn.value))
         else:
             return [str(dn.value)]
 
+    def _find_entry(self, commonname: str | None, sans: x509.GeneralNames) -> CertStoreEntry | None:
+        """
+        Return the first stored entry matching (in order) the common name, any of the SANs,
+        the catch-all "*", or a previously generated certificate for exactly these names.
+        """
+        # All asterisk forms of a domain share its last label, so we can skip the expansion
+        # if no custom cert has been registered for that label.
+        if commonname and commonname.rpartition(".")[2] in self._known_suffixes:
+            for key in _asterisk_forms(commonname):
+                if (entry := self.certs.get(key)) is not None:
+                    return entry
+        for s in sans:
+            if isinstance(s, x509.DNSName):
+                if s.value.rpartition(".")[2] not in self._known_suffixes:
+                    continue
+                keys = _asterisk_forms(s.value)
+            else:
+                keys = (str(s.value),)
+            for key in keys:
+                if (entry := self.certs.get(key)) is not None:
+                    return entry
+        if (entry := self.certs.get("*")) is not None:
+            return entry
+        return self.certs.get((commonname, sans))
+
     def get_cert(
         self,
         commonname: str | None,
@@ -574,22 +780,17 @@ class CertStore:
         """
         sans = _fix_legacy_sans(sans)
 
-        potential_keys: list[TCertId] = []
-        if commonname:
-            potential_keys.extend(self.asterisk_forms(commonname))
-        for s in sans:
-            potential_keys.extend(self.asterisk_forms(s))
-        potential_keys.append("*")
-        potential_keys.append((commonname, sans))
+        cache_key: TLookupKey = (commonname, tuple(sorted((type(s).__name__, str(s.value)) for s in sans)))
+        if cache_key in self._lookup_cache:
+            self._lookup_cache.move_to_end(cache_key)
+            return self._lookup_cache[cache_key]
 
-        name = next(filter(lambda key: key in self.certs, potential_keys), None)
-        if name:
-            entry = self.certs[name]
-        else:
+        entry = self._find_entry(commonname, sans)
+        if entry is None:
             entry = CertStoreEntry(
-                cert=dummy_cert(
+                cert=_dummy_cert(
                     self.default_privatekey,
-                    self.default_ca._cert,
+                    self._dummy_cert_template,
                     commonname,
                     sans,
                     organization,
@@ -599,8 +800,14 @@ class CertStore:
                 chain_certs=self.default_chain_certs,
             )
             self.certs[(commonname, sans)] = entry
+            self._entry_keys.setdefault(id(entry), []).append((commonname, sans))
+            # A generated entry is only ever found under the lookup key it was generated for.
+            self._entry_lookup_keys[id(entry)] = cache_key
             self.expire(entry)
 
+        self._lookup_cache[cache_key] = entry
+        if len(self._lookup_cache) > self.STORE_CAP:
+            self._lookup_cache.popitem(last=False)
         return entry
 
 
@@ -615,3 +822,75 @@ def load_pem_private_key(data: bytes, password: bytes | None) -> rsa.RSAPrivateK
         if password is not None:
             return load_pem_private_key(data, None)
         raise
+
+
+def _split_pem(raw: bytes) -> tuple[bytes, list[bytes]]:
+    """
+    Split a concatenation of PEM blocks into the (first) private key block and all certificate blocks,
+    so that each block only needs to be parsed once.
+    """
+    key_block = b""
+    cert_blocks = []
+    pos = 0
+    while (start := raw.find(b"-----BEGIN ", pos)) != -1:
+        label_end = raw.find(b"-----", start + 11)
+        if label_end == -1:
+            break
+        label = raw[start + 11 : label_end]
+        end_marker = b"-----END " + label + b"-----"
+        end = raw.find(end_marker, label_end)
+        if end == -1:
+            break
+        pos = end + len(end_marker)
+        if label.endswith(b"PRIVATE KEY"):
+            if not key_block:
+                key_block = raw[start:pos]
+        elif label in (b"CERTIFICATE", b"X509 CERTIFICATE"):
+            cert_blocks.append(raw[start:pos])
+    return key_block, cert_blocks
+
+
+def _read_ca_cache(cache_file: Path, digest: bytes) -> tuple[rsa.RSAPrivateKey, list[x509.Certificate]] | None:
+    """
+    Load the private key and certificates from a cache written by `_write_ca_cache`,
+    or return None if the cache is missing, corrupt or was not written for a PEM file with the given digest.
+    """
+    try:
+        data = cache_file.read_bytes()
+        if data[: len(digest)] != digest:
+            return None
+        blobs = []
+        offset = len(digest)
+        while offset < len(data):
+            (length,) = struct.unpack_from("!I", data, offset)
+            offset += 4
+            blobs.append(data[offset : offset + length])
+            offset += length
+        key_der, *cert_ders = blobs
+        # The key has been validated when it was first loaded from the exact same PEM bytes.
+        key = serialization.load_der_private_key(key_der, None, unsafe_skip_rsa_key_validation=True)
+        certs = [x509.load_der_x509_certificate(c) for c in cert_ders]
+    except (OSError, ValueError, TypeError, struct.error) as e:
+        if not isinstance(e, FileNotFoundError):
+            logger.debug(f"Ignoring CA cache {cache_file}: {e}")
+        return None
+    if not certs:
+        return None
+    return cast(rsa.RSAPrivateKey, key), certs
+
+
+def _write_ca_cache(cache_file: Path, digest: bytes, key: rsa.RSAPrivateKey, certs: list[x509.Certificate]) -> None:
+    blobs = [
+        key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ),
+        *(c.public_bytes(serialization.Encoding.DER) for c in certs),
+    ]
+    data = digest + b"".join(struct.pack("!I", len(b)) + b for b in blobs)
+    try:
+        with CertStore.umask_secret():
+            cache_file.write_bytes(data)
+    except OSError as e:
+        logger.debug(f"Unable to write CA cache {cache_file}: {e}")
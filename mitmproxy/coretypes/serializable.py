@@ -27,6 +27,8 @@ class Serializable(metaclass=abc.ABCMeta):
     Abstract Base Class that defines an API to save an object's state and restore it later on.
     """
 
+    __slots__ = ()
+
     @classmethod
     @abc.abstractmethod
     def from_state(cls: type[T], state) -> T:
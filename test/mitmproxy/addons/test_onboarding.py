@@ -0,0 +1,97 @@
+import gc
+import io
+import os
+import zipfile
+
+import pytest
+
+from mitmproxy import http
+from mitmproxy.addons import onboarding
+from mitmproxy.test import taddons
+from mitmproxy.test import tflow
+from mitmproxy.test import tutils
+
+
+def tcertflow(path: str, **headers: str) -> http.HTTPFlow:
+    req = tutils.treq(
+        host="mitm.it",
+        port=80,
+        path=path.encode(),
+        headers=http.Headers(**headers),
+        content=b"",
+    )
+    return tflow.tflow(req=req)
+
+
+@pytest.mark.parametrize("ext", ["pem", "p12", "cer"])
+async def test_cert(tmp_path, ext):
+    ob = onboarding.Onboarding()
+    with taddons.context(ob) as tctx:
+        tctx.configure(ob, confdir=str(tmp_path))
+        (tmp_path / f"mitmproxy-ca-cert.{ext}").write_bytes(b"cert")
+
+        f = tcertflow(f"/cert/{ext}")
+        await ob.request(f)
+        assert f.response.status_code == 200
+        assert f.response.content == b"cert"
+        assert f.response.headers["Content-Disposition"] == f"attachment; filename=mitmproxy-ca-cert.{ext}"
+        etag = f.response.headers["ETag"]
+
+        f = tcertflow(f"/cert/{ext}", if_none_match=etag)
+        await ob.request(f)
+        assert f.response.status_code == 304
+
+
+@pytest.mark.filterwarnings("error::ResourceWarning")
+async def test_cert_no_leak(tmp_path):
+    # WsgiToAsgi never closes the WSGI response, so downloads must not keep files open.
+    ob = onboarding.Onboarding()
+    with taddons.context(ob) as tctx:
+        tctx.configure(ob, confdir=str(tmp_path))
+        (tmp_path / "mitmproxy-ca-cert.pem").write_bytes(b"cert")
+        for _ in range(3):
+            f = tcertflow("/cert/pem")
+            await ob.request(f)
+            assert f.response.status_code == 200
+        gc.collect()
+
+
+async def test_cert_updated(tmp_path):
+    ob = onboarding.Onboarding()
+    with taddons.context(ob) as tctx:
+        tctx.configure(ob, confdir=str(tmp_path))
+        p = tmp_path / "mitmproxy-ca-cert.pem"
+        p.write_bytes(b"old")
+        os.utime(p, ns=(0, 1_000_000_000))
+
+        f = tcertflow("/cert/pem")
+        await ob.request(f)
+        assert f.response.content == b"old"
+        etag = f.response.headers["ETag"]
+
+        p.write_bytes(b"new")
+        os.utime(p, ns=(0, 2_000_000_000))
+        f = tcertflow("/cert/pem", if_none_match=etag)
+        await ob.request(f)
+        assert f.response.status_code == 200
+        assert f.response.content == b"new"
+        assert f.response.headers["ETag"] != etag
+
+
+async def test_magisk(tmp_path):
+    ob = onboarding.Onboarding()
+    with taddons.context(ob) as tctx:
+        tctx.configure(ob, confdir=str(tmp_path))
+
+        f = tcertflow("/cert/magisk")
+        await ob.request(f)
+        assert f.response.status_code == 200
+        assert f.response.headers["Content-Type"] == "application/zip"
+        assert f.response.headers["Content-Disposition"] == "attachment; filename=mitmproxy-magisk-module.zip"
+        with zipfile.ZipFile(io.BytesIO(f.response.content)) as z:
+            assert "module.prop" in z.namelist()
+        etag = f.response.headers["ETag"]
+
+        f = tcertflow("/cert/magisk", if_none_match=etag)
+        await ob.request(f)
+        assert f.response.status_code == 304
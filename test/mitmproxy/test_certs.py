@@ -0,0 +1,274 @@
+import ipaddress
+import os
+import shutil
+import stat
+import sys
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+from mitmproxy import certs
+
+
+@pytest.fixture(scope="module")
+def ca_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("ca")
+    certs.CertStore.create_store(path, "mitmproxy", 2048)
+    return path
+
+
+@pytest.fixture
+def store(ca_dir) -> certs.CertStore:
+    return certs.CertStore.from_store(ca_dir, "mitmproxy", 2048)
+
+
+def custom_entry(store: certs.CertStore, commonname: str, sans: list[x509.GeneralName]) -> certs.CertStoreEntry:
+    cert = certs.dummy_cert(store.default_privatekey, store.default_ca._cert, commonname, sans)
+    return certs.CertStoreEntry(cert, store.default_privatekey, None, [cert])
+
+
+class TestLookupCache:
+    def test_hit(self, store):
+        a = store.get_cert("example.com", [x509.DNSName("example.com")])
+        b = store.get_cert("example.com", [x509.DNSName("example.com")])
+        assert a is b
+
+    def test_dns_vs_ip(self, store):
+        dns = store.get_cert("1.2.3.4", [x509.DNSName("1.2.3.4")])
+        ip = store.get_cert("1.2.3.4", [x509.IPAddress(ipaddress.ip_address("1.2.3.4"))])
+        assert dns is not ip
+        assert list(dns.cert.altnames) == [x509.DNSName("1.2.3.4")]
+        assert list(ip.cert.altnames) == [x509.IPAddress(ipaddress.ip_address("1.2.3.4"))]
+
+    def test_add_cert_after_lookup(self, store):
+        generated = store.get_cert("www.example.com", [x509.DNSName("www.example.com")])
+        custom = custom_entry(store, "custom", [])
+        store.add_cert(custom, "*.example.com")
+        assert store.get_cert("www.example.com", [x509.DNSName("www.example.com")]) is custom
+        assert generated.cert != custom.cert
+
+    def test_san_order(self, store):
+        a = store.get_cert("example.com", [x509.DNSName("a.example.com"), x509.DNSName("b.example.com")])
+        b = store.get_cert("example.com", [x509.DNSName("b.example.com"), x509.DNSName("a.example.com")])
+        assert a is b
+
+
+def test_expire(store):
+    store.STORE_CAP = 5
+    custom = custom_entry(store, "custom", [])
+    store.add_cert(custom, "custom.test")
+
+    generated = [store.get_cert(f"host{i}.test", [x509.DNSName(f"host{i}.test")]) for i in range(12)]
+
+    assert len(store.expire_queue) == 5
+    assert [k for k in store.certs if isinstance(k, tuple)] == [(e.cert.cn, e.cert.altnames) for e in generated[-5:]]
+    assert len(store._lookup_cache) == 5
+    assert len(store._entry_lookup_keys) == 5
+    assert len(store._entry_keys) == 5 + 1
+    # evicted entries are regenerated, recent ones are still cached
+    assert store.get_cert("host0.test", [x509.DNSName("host0.test")]) is not generated[0]
+    assert store.get_cert("host11.test", [x509.DNSName("host11.test")]) is generated[11]
+
+    assert store.certs["custom"] is custom
+    assert store.certs["custom.test"] is custom
+    assert store.get_cert("custom.test", []) is custom
+
+
+class TestCACache:
+    @pytest.fixture
+    def ca_copy(self, ca_dir, tmp_path):
+        shutil.copytree(ca_dir, tmp_path, dirs_exist_ok=True)
+        (tmp_path / "mitmproxy-ca.pem.cache").unlink(missing_ok=True)
+        return tmp_path
+
+    def load(self, path, passphrase=None) -> certs.CertStore:
+        return certs.CertStore.from_files(path / "mitmproxy-ca.pem", path / "mitmproxy-dhparam.pem", passphrase)
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="no POSIX permissions")
+    def test_created_private(self, ca_copy):
+        self.load(ca_copy)
+        assert stat.S_IMODE((ca_copy / "mitmproxy-ca.pem.cache").stat().st_mode) == 0o600
+
+    def test_used(self, ca_copy):
+        a = self.load(ca_copy)
+        b = self.load(ca_copy)
+        assert a.default_ca == b.default_ca
+        assert a.default_privatekey.private_numbers() == b.default_privatekey.private_numbers()
+
+    def test_pem_replaced(self, ca_copy, tmp_path_factory):
+        other = tmp_path_factory.mktemp("other")
+        certs.CertStore.create_store(other, "mitmproxy", 2048)
+        ca_file = ca_copy / "mitmproxy-ca.pem"
+        old = ca_file.read_bytes()
+        new = (other / "mitmproxy-ca.pem").read_bytes()
+        # Simulate a same-size replacement that preserves the mtime (e.g. cp -p).
+        size = max(len(old), len(new))
+        ca_file.write_bytes(old.ljust(size, b"\n"))
+        self.load(ca_copy)
+        st = ca_file.stat()
+        ca_file.write_bytes(new.ljust(size, b"\n"))
+        os.utime(ca_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert ca_file.stat().st_size == st.st_size
+
+        store = self.load(ca_copy)
+        assert store.default_ca == self.load(other).default_ca
+
+    @pytest.mark.parametrize("corrupt", [lambda d: b"", lambda d: b"garbage", lambda d: d[: len(d) // 2], lambda d: d[:-1]])
+    def test_corrupt(self, ca_copy, corrupt):
+        expected = self.load(ca_copy)
+        cache = ca_copy / "mitmproxy-ca.pem.cache"
+        cache.write_bytes(corrupt(cache.read_bytes()))
+        store = self.load(ca_copy)
+        assert store.default_ca == expected.default_ca
+        assert store.default_privatekey.private_numbers() == expected.default_privatekey.private_numbers()
+
+    def test_passphrase(self, ca_copy):
+        self.load(ca_copy, passphrase=b"password")
+        assert not (ca_copy / "mitmproxy-ca.pem.cache").exists()
+
+
+class TestSplitPem:
+    @pytest.fixture(scope="class")
+    def pem(self, ca_dir):
+        store = certs.CertStore.from_store(ca_dir, "mitmproxy", 2048)
+        return store.default_privatekey, store.default_ca.to_pem()
+
+    def key_pem(self, key, fmt, encryption=serialization.NoEncryption()) -> bytes:
+        return key.private_bytes(serialization.Encoding.PEM, fmt, encryption)
+
+    def test_key_first(self, pem):
+        key, cert = pem
+        key_pem = self.key_pem(key, serialization.PrivateFormat.TraditionalOpenSSL)
+        assert certs._split_pem(key_pem + cert + cert) == (key_pem.strip(), [cert.strip(), cert.strip()])
+
+    def test_cert_first(self, pem):
+        key, cert = pem
+        key_pem = self.key_pem(key, serialization.PrivateFormat.PKCS8)
+        assert certs._split_pem(cert + key_pem) == (key_pem.strip(), [cert.strip()])
+
+    @pytest.mark.parametrize(
+        "fmt, label",
+        [
+            (serialization.PrivateFormat.TraditionalOpenSSL, b"RSA PRIVATE KEY"),
+            (serialization.PrivateFormat.PKCS8, b"ENCRYPTED PRIVATE KEY"),
+        ],
+    )
+    def test_encrypted_key(self, pem, fmt, label):
+        key, cert = pem
+        key_pem = self.key_pem(key, fmt, serialization.BestAvailableEncryption(b"password"))
+        assert key_pem.startswith(b"-----BEGIN " + label + b"-----")
+        key_block, cert_blocks = certs._split_pem(key_pem + cert)
+        assert key_block == key_pem.strip()
+        assert certs.load_pem_private_key(key_block, b"password").private_numbers() == key.private_numbers()
+
+    def test_x509_certificate_label(self, pem):
+        _, cert = pem
+        legacy = cert.replace(b"-----BEGIN CERTIFICATE-----", b"-----BEGIN X509 CERTIFICATE-----").replace(
+            b"-----END CERTIFICATE-----", b"-----END X509 CERTIFICATE-----"
+        )
+        _, cert_blocks = certs._split_pem(legacy)
+        assert cert_blocks == [legacy.strip()]
+        assert x509.load_pem_x509_certificate(cert_blocks[0]) == x509.load_pem_x509_certificate(cert)
+
+    @pytest.mark.parametrize(
+        "truncate",
+        [
+            lambda b: b[: len(b) // 2],
+            lambda b: b.replace(b"-----END", b""),
+            lambda b: b[: b.index(b"-----", 11)],
+            lambda b: b[:11],
+        ],
+    )
+    def test_truncated(self, pem, truncate):
+        key, cert = pem
+        key_pem = self.key_pem(key, serialization.PrivateFormat.TraditionalOpenSSL)
+        assert certs._split_pem(cert + truncate(key_pem)) == (b"", [cert.strip()])
+        assert certs._split_pem(key_pem + truncate(cert)) == (key_pem.strip(), [])
+
+    def test_no_key(self, pem, tmp_path):
+        _, cert = pem
+        (tmp_path / "ca.pem").write_bytes(cert)
+        with pytest.raises(ValueError):
+            certs.CertStore.from_files(tmp_path / "ca.pem", tmp_path / "dhparam.pem")
+
+    def test_no_cert(self, pem, tmp_path):
+        key, _ = pem
+        (tmp_path / "ca.pem").write_bytes(self.key_pem(key, serialization.PrivateFormat.PKCS8))
+        with pytest.raises(ValueError, match="No certificate found"):
+            certs.CertStore.from_files(tmp_path / "ca.pem", tmp_path / "dhparam.pem")
+
+
+class TestKnownSuffixes:
+    def test_wildcard_cn(self, store):
+        custom = custom_entry(store, "custom", [])
+        store.add_cert(custom, "*.example.com")
+        assert store.get_cert("www.example.com", []) is custom
+        assert store.get_cert("www.example.org", []) is not custom
+
+    def test_wildcard_san(self, store):
+        custom = custom_entry(store, "custom", [])
+        store.add_cert(custom, "*.example.com")
+        assert store.get_cert(None, [x509.DNSName("www.example.com")]) is custom
+        assert store.get_cert("unknown.test", [x509.DNSName("www.example.com")]) is custom
+
+    def test_catch_all(self, store):
+        custom = custom_entry(store, "custom", [])
+        store.add_cert(custom, "*")
+        assert "unknown" not in store._known_suffixes
+        assert store.get_cert("foo.unknown", [x509.DNSName("foo.unknown")]) is custom
+
+    def test_ip_san(self, store):
+        custom = custom_entry(store, "custom", [])
+        store.add_cert(custom, "10.0.0.1")
+        assert store.get_cert("host.test", [x509.IPAddress(ipaddress.ip_address("10.0.0.1"))]) is custom
+        assert store.get_cert("host.test", [x509.IPAddress(ipaddress.ip_address("10.0.0.2"))]) is not custom
+
+
+class TestSerial:
+    def test_next_serial(self):
+        serials = [certs._next_serial() for _ in range(3 * 512)]
+        assert all(0 < s < 2**159 for s in serials)
+        assert len(set(serials)) == len(serials)
+
+    def test_reset_after_fork(self):
+        lock = certs._serial_lock
+        with lock:
+            # Simulate a fork while another thread holds the lock.
+            certs._reset_serial_pool()
+            assert certs._serial_lock is not lock
+            assert certs._next_serial() > 0
+
+
+class TestChainCerts:
+    def test_from_files(self, ca_dir, tmp_path, monkeypatch):
+        ca_pem = (ca_dir / "mitmproxy-ca.pem").read_bytes()
+        other = custom_entry(certs.CertStore.from_store(ca_dir, "mitmproxy", 2048), "intermediate", []).cert
+        (tmp_path / "ca.pem").write_bytes(ca_pem + other.to_pem())
+
+        def fail(path):
+            raise AssertionError("chain file must not be parsed twice")
+
+        monkeypatch.setattr(certs, "_load_chain_certs", fail)
+        store = certs.CertStore.from_files(tmp_path / "ca.pem", ca_dir / "mitmproxy-dhparam.pem")
+        assert store.default_chain_file == tmp_path / "ca.pem"
+        assert store.default_chain_certs == [store.default_ca, other]
+
+    def test_without_chain(self, store):
+        assert store.default_chain_file is None
+        assert store.default_chain_certs == [store.default_ca]
+
+    def test_load_chain_certs(self, store, tmp_path):
+        a = custom_entry(store, "aaaa", []).cert
+        b = custom_entry(store, "bbbb", []).cert
+        chain = tmp_path / "chain.pem"
+        chain.write_bytes(a.to_pem())
+        assert certs._load_chain_certs(chain) == [a]
+        assert certs._load_chain_certs(chain)[0] is certs._load_chain_certs(chain)[0]
+
+        # Same-size replacement that preserves the mtime (e.g. cp -p).
+        st = chain.stat()
+        chain.write_bytes(b.to_pem())
+        os.utime(chain, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert chain.stat().st_size == st.st_size
+        assert certs._load_chain_certs(chain) == [b]